@@ -1,4 +1,3 @@
-import nltk
 import flask
 from flask import Flask, request, abort
 
@@ -6,84 +5,107 @@ from shop_cart_nlp.database import DBaccess
 from shop_cart_nlp.objects import Product
 from shop_cart_nlp.processor import Processor
 
-app = Flask(__name__)
 
-
-@app.route('/', methods=['GET'])
-@app.route('/info', methods=['GET'])
-def name():
-    return flask.jsonify({
-        'title': 'Projekt z Podstaw przetwarzania jezyka naturalnego [NLP]',
-        'semester': '21L',
-        'authors': ['Przemyslaw Stawczyk', 'Kamil Zacharczuk'],
-        'status': 'running'
-    }), 200
-
-
-@app.route("/product", methods=['GET'])
-def get_products():
-    return {"products": database.get_products()}
-
-
-@app.route('/product/<prod_id>', methods=['GET'])
-def get_one_product(prod_id):
-    tmp = database.get_product(prod_id)
-    if tmp is None:
-        abort(400)
-    else:
-        return flask.jsonify(tmp)
-
-
-@app.route("/product", methods=['POST'])
-def add_products():
-    products_attr = "products"
-    if not request.json \
-            or products_attr not in request.json \
-            or not isinstance(request.json[products_attr], list):
-        abort(400)
-
-    try:
-        database.add_products(
-            [Product(p["name"], p["description"]) for p in request.json[products_attr]]
+def create_app(database: DBaccess = None, processor: Processor = None):
+    """
+    Application factory, intended also for WSGI servers e.g. 'app:create_app()'
+    :param database: Database connection, default one if None
+    :param processor: Processor with loaded index, index is loaded from database if None
+    :return: Flask application
+    """
+    Processor.ensure_nltk_data()
+
+    if database is None:
+        database = DBaccess()
+        database.migrate_schema()
+    if processor is None:
+        processor = Processor(database)
+        processor.load_index_from_db()
+
+    app = Flask(__name__)
+
+    @app.before_request
+    def refresh_index():
+        # NOTE : picks up catalog changes made by other processes (workers)
+        processor.refresh_from_db()
+
+    @app.route('/', methods=['GET'])
+    @app.route('/info', methods=['GET'])
+    def name():
+        return flask.jsonify({
+            'title': 'Projekt z Podstaw przetwarzania jezyka naturalnego [NLP]',
+            'semester': '21L',
+            'authors': ['Przemyslaw Stawczyk', 'Kamil Zacharczuk'],
+            'status': 'running'
+        }), 200
+
+    @app.route("/product", methods=['GET'])
+    def get_products():
+        return {"products": database.get_products()}
+
+    @app.route('/product/<prod_id>', methods=['GET'])
+    def get_one_product(prod_id):
+        tmp = database.get_product(prod_id)
+        if tmp is None:
+            abort(400)
+        else:
+            return flask.jsonify(tmp)
+
+    @app.route("/product", methods=['POST'])
+    def add_products():
+        products_attr = "products"
+        if not request.json \
+                or products_attr not in request.json \
+                or not isinstance(request.json[products_attr], list):
+            abort(400)
+
+        try:
+            products = []
+            for p in request.json[products_attr]:
+                category = p.get("category") or database.default_category
+                if not isinstance(category, str) or not category.strip():
+                    return "Invalid JSON object. Category must be a non-empty string", 400
+                category = category.strip()
+                products.append(Product(p["name"], p["description"], category=category))
+            database.add_products(products)
+        except KeyError as e:
+            return "Invalid JSON object. The following key was not found: " + str(e), 400
+        except RuntimeError as e:
+            return "Failed to add products. Details: " + str(e), 400
+
+        try:
+            # NOTE : only shards of new products are rebuilt
+            processor.learn_from_db({p.category for p in products})
+        except Exception as e:
+            print("ERROR updating index. Exception: " + str(e))
+
+        return flask.Response(status=200)
+
+    @app.route('/product/<prod_id>', methods=['DELETE'])
+    def delete_product(prod_id):
+        product = database.get_product(prod_id)
+        database.remove_product(prod_id)
+        if product:
+            database.bump_version(product.category)
+            processor.load_index_from_db([product.category])
+        return flask.Response(status=204)
+
+    @app.route("/cart", methods=['POST'])
+    def complete_cart():
+        shopping_list_attr = "shoppingList"
+        if not request.json \
+                or shopping_list_attr not in request.json:
+            abort(400)
+
+        products = processor.find_products_for_shopping_list(
+            request.json[shopping_list_attr]
         )
-    except KeyError as e:
-        return "Invalid JSON object. The following key was not found: " + str(e), 400
-    except RuntimeError as e:
-        return "Failed to add products. Details: " + str(e), 400
 
-    try:
-        processor.learn_from_db()
-    except Exception as e:
-        print("ERROR updating index. Exception: " + str(e))
+        return {"products": products}
 
-    return flask.Response(status=200)
-
-
-@app.route('/product/<prod_id>', methods=['DELETE'])
-def delete_product(prod_id):
-    database.remove_product(prod_id)
-    return flask.Response(status=204)
-
-
-@app.route("/cart", methods=['POST'])
-def complete_cart():
-    shopping_list_attr = "shoppingList"
-    if not request.json \
-            or shopping_list_attr not in request.json:
-        abort(400)
-
-    products = processor.find_products_for_shopping_list(
-        request.json[shopping_list_attr]
-    )
-
-    return {"products": products}
+    return app
 
 
 if __name__ == '__main__':
-    nltk.download('stopwords')  # if downloaded it will skip
-    nltk.download('punkt')
-    # NOTE : global scope
-    database = DBaccess()
-    processor = Processor(database)
-
-    app.run(debug=True)
+    # NOTE : development server, see serve.py for multi-worker mode
+    create_app().run(debug=True)
@@ -1,3 +1,5 @@
+import os
+
 import nltk
 import csv
 from shop_cart_nlp.database import DBaccess
@@ -9,13 +11,16 @@ if __name__ == '__main__':
     datasets = ['data/food.csv', 'data/movies.csv', 'data/outdoor.csv']
     products = []
     for i in datasets:
+        # NOTE : each dataset is a separate category (shard) e.g. 'food'
+        category = os.path.splitext(os.path.basename(i))[0]
         with open(i) as file:
             reader = csv.reader(file)
             for line in reader:
-                products.append(Product(line[0], line[1]))
+                products.append(Product(line[0], line[1], category=category))
 
     database = DBaccess()
     database.init_schema()
+    database.migrate_schema()
     database.add_products(products=products)
 
     processor = Processor(database=database)
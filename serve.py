@@ -0,0 +1,142 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from app import create_app
+from shop_cart_nlp.database import DBaccess
+from shop_cart_nlp.processor import Processor
+
+# NOTE : seconds to wait before replacing dead worker, so a worker crashing on start does not fork in a loop
+respawn_delay = 1.
+
+
+# NOTE : stdlib only - wsgiref speaks HTTP/1.0 without keep-alive and each worker handles one request at a time,
+#        throughput was not benchmarked; use a production WSGI server (see README) for real deployments
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        # NOTE : logging every request to stderr costs throughput
+        pass
+
+
+def worker(listener: socket.socket, app, processor: Processor):
+    """
+    Serve requests from socket shared with other workers
+    :param listener: bound and listening socket inherited from master
+    :param app: WSGI application
+    :param processor: Processor used by application
+    """
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, lambda *_: processor.request_reload())
+
+    host, port = listener.getsockname()[:2]
+    server = WSGIServer((host, port), QuietHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+    server.setup_environ()
+    server.set_app(app)
+    server.serve_forever()
+
+
+def spawn(listener: socket.socket, app, processor: Processor) -> int:
+    """
+    Fork worker process
+    :return: pid of worker
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            worker(listener, app, processor)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def positive_int(value: str) -> int:
+    """
+    Argument type accepting integers greater than zero
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker server sharing preloaded index between workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=positive_int, default=os.cpu_count())
+    parser.add_argument("--db", default="data/db.sqlite")
+    args = parser.parse_args()
+
+    # NOTE : before forking, so workers do not download it each
+    Processor.ensure_nltk_data()
+
+    # NOTE : index loaded once in master, workers share its memory (copy-on-write)
+    database = DBaccess(args.db)
+    database.migrate_schema()
+    processor = Processor(database)
+    processor.load_index_from_db()
+    app = create_app(database, processor)
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+
+    # NOTE : keep garbage collector from touching (and copying) preloaded objects in workers
+    gc.freeze()
+
+    workers = {spawn(listener, app, processor) for _ in range(args.workers)}
+    print("Serving on http://{}:{} with {} workers".format(args.host, args.port, len(workers)))
+
+    def forward(signum, _):
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                # NOTE : worker already reaped, but not yet removed from set
+                pass
+
+    # SIGHUP - force workers to reload index from database
+    signal.signal(signal.SIGHUP, forward)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        while True:
+            pid, status = os.wait()
+            if pid in workers:
+                workers.remove(pid)
+                print("Worker {} exited with status {}, respawning".format(pid, os.waitstatus_to_exitcode(status)))
+                time.sleep(respawn_delay)
+                workers.add(spawn(listener, app, processor))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+if __name__ == '__main__':
+    main()
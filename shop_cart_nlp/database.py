@@ -9,12 +9,22 @@ class DBaccess:
     #        queries may be static and allocated once !!!
     test_query = "SELECT name FROM sqlite_master WHERE type='table' AND name='products';"
 
+    # NOTE : products without explicit category end up in this shard
+    default_category = "general"
+
     create_prod = "CREATE TABLE products" \
                   "(prod_id INTEGER PRIMARY KEY AUTOINCREMENT," \
                   "name TEXT NOT NULL UNIQUE," \
                   "description TEXT," \
                   "amount REAL," \
-                  "unit TEXT );"
+                  "unit TEXT," \
+                  "category TEXT NOT NULL DEFAULT 'general');"
+
+    add_category = "ALTER TABLE products ADD COLUMN category TEXT NOT NULL DEFAULT 'general';"
+
+    create_version = "CREATE TABLE IF NOT EXISTS catalog_version" \
+                     "(category TEXT NOT NULL PRIMARY KEY," \
+                     "version INTEGER NOT NULL DEFAULT 0);"
 
     create_stem = "CREATE TABLE stems" \
                   "(stem_id INTEGER PRIMARY KEY AUTOINCREMENT," \
@@ -60,12 +70,28 @@ class DBaccess:
             cur.execute(self.create_prod)
             cur.execute(self.create_stem)
             cur.execute(self.create_prod_stem)
+            cur.execute(self.create_version)
             # weird commit in sqlite API
             cur.connection.commit()
             cur.close()
         else:
             raise RuntimeWarning("Database has been already initialized")
 
+    def migrate_schema(self):
+        """
+        Adds category column and catalog versions to database created before they were introduced
+        :return: None
+        """
+        con = sqlite3.connect(self.url)
+        cur = con.cursor()
+        columns = [row[1] for row in cur.execute("PRAGMA table_info(products);")]
+        if columns and "category" not in columns:
+            cur.execute(self.add_category)
+        cur.execute(self.create_version)
+        # weird commit in sqlite API
+        cur.connection.commit()
+        cur.close()
+
     def delete_all_data(self):
         """
         Delete all data from database [intended for debugging and "retrain"]
@@ -76,6 +102,7 @@ class DBaccess:
         cur.execute("DELETE FROM product_stem;")
         cur.execute("DELETE FROM products;")
         cur.execute("DELETE FROM stems;")
+        cur.execute("DELETE FROM catalog_version;")
 
         # weird commit in sqlite API
         cur.connection.commit()
@@ -146,11 +173,11 @@ class DBaccess:
         con = sqlite3.connect(self.url)
         cur = con.cursor()
 
-        query = "INSERT OR IGNORE INTO products (name, description) VALUES"
+        query = "INSERT OR IGNORE INTO products (name, description, category) VALUES"
         values = list()
         for p in products:
-            query += "(?,?),"
-            values += [p.name, p.description]
+            query += "(?,?,?),"
+            values += [p.name, p.description, p.category or self.default_category]
         query = query[:-1]
 
         try:
@@ -222,50 +249,23 @@ class DBaccess:
         cur.connection.commit()
         cur.close()
 
-    def get_products_for_stem(self, stem):
-        """
-        Get all products referencing certain stem
-        :param stem: stem object or string
-        :return: list of products
-        """
-        if isinstance(stem, Stem):
-            val = stem.value
-        elif isinstance(stem, str):
-            val = stem
-        else:
-            raise RuntimeError("Not a valid stem")
-
-        products = []
-        con = sqlite3.connect(self.url)
-        cur = con.cursor()
-
-        res = cur.execute("SELECT p.prod_id, p.name, p.description, p.amount, p.unit "
-                          "FROM products p "
-                          "JOIN product_stem ps ON p.prod_id = ps.prod_id "
-                          "WHERE ps.stem_id = ("
-                          "    SELECT stem_id FROM stems WHERE value = ?"
-                          ");",
-                          (val,))
-
-        for line in res:
-            products.append(Product(prod_id=line[0], name=line[1], description=line[2], amount=line[3], unit=line[4]))
-
-        cur.close()
-        return products
-
-    def get_products(self):
+    def get_products(self, category=None):
         """
         Get all products
+        :param category: if given only products from this shard are returned
         :return: list of products
         """
         con = sqlite3.connect(self.url)
         cur = con.cursor()
 
-        res = cur.execute("SELECT prod_id, name, description, amount, unit "
-                          "FROM products;")
+        res = cur.execute("SELECT prod_id, name, description, amount, unit, category "
+                          "FROM products "
+                          "WHERE ? IS NULL OR category = ?;",
+                          (category, category))
 
         products = [
-            Product(prod_id=line[0], name=line[1], description=line[2], amount=line[3], unit=line[4])
+            Product(prod_id=line[0], name=line[1], description=line[2], amount=line[3], unit=line[4],
+                    category=line[5])
             for line in res
         ]
 
@@ -280,25 +280,113 @@ class DBaccess:
         con = sqlite3.connect(self.url)
         cur = con.cursor()
 
-        res = cur.execute("SELECT prod_id, name, description, amount, unit "
+        res = cur.execute("SELECT prod_id, name, description, amount, unit, category "
                           "FROM products WHERE prod_id = ?;",
                           (prod_id,))
 
-        if res:
-            row = res.fetchone()
-            product = Product(prod_id=row[0], name=row[1], description=row[2], amount=row[3], unit=row[4])
+        row = res.fetchone()
+        if row:
+            product = Product(prod_id=row[0], name=row[1], description=row[2], amount=row[3], unit=row[4],
+                              category=row[5])
         else:
             product = None
 
         cur.close()
         return product
 
+    def get_categories(self):
+        """
+        Get names of all categories (shards) present in database
+        :return: list of category names
+        """
+        con = sqlite3.connect(self.url)
+        cur = con.cursor()
+
+        res = cur.execute("SELECT DISTINCT category FROM products ORDER BY category;")
+        categories = [line[0] for line in res]
+
+        cur.close()
+        return categories
+
+    def get_indexed_products(self, categories: Collection[str] = None):
+        """
+        Get products together with stems saved in index
+        :param categories: if given only products from these shards are returned
+        :return: list of pairs (product, set of stems)
+        """
+        query = "SELECT p.prod_id, p.name, p.description, p.amount, p.unit, p.category, s.value " \
+                "FROM products p " \
+                "JOIN product_stem ps ON p.prod_id = ps.prod_id " \
+                "JOIN stems s ON ps.stem_id = s.stem_id"
+        values = list()
+        if categories is not None:
+            if not categories:
+                return []
+            query += " WHERE p.category IN (" + ",".join("?" * len(categories)) + ")"
+            values = list(categories)
+
+        con = sqlite3.connect(self.url)
+        cur = con.cursor()
+
+        res = cur.execute(query + ";", values)
+
+        indexed = {}
+        for line in res:
+            if line[0] not in indexed:
+                product = Product(prod_id=line[0], name=line[1], description=line[2], amount=line[3], unit=line[4],
+                                  category=line[5])
+                indexed[line[0]] = (product, set())
+            indexed[line[0]][1].add(line[6])
+
+        cur.close()
+        return list(indexed.values())
+
+    def bump_version(self, category):
+        """
+        Mark category as changed, so processes serving its shard know to reload it
+        :param category: category name
+        :return: new version of category
+        """
+        con = sqlite3.connect(self.url)
+        cur = con.cursor()
+
+        try:
+            cur.execute("INSERT INTO catalog_version (category, version) VALUES (?, 1) "
+                        "ON CONFLICT (category) DO UPDATE SET version = version + 1;",
+                        (category,))
+            version = cur.execute("SELECT version FROM catalog_version WHERE category = ?;",
+                                  (category,)).fetchone()[0]
+
+            # weird commit in sqlite API
+            cur.connection.commit()
+        except sqlite3.IntegrityError as e:
+            raise RuntimeError(e)
+        finally:
+            cur.close()
+            # NOTE : closing connection rolls back failed transaction, so it does not keep database locked
+            con.close()
+        return version
+
+    def get_versions(self):
+        """
+        Get versions of all categories
+        :return: dict of category name to version
+        """
+        con = sqlite3.connect(self.url)
+        cur = con.cursor()
+
+        res = cur.execute("SELECT category, version FROM catalog_version;")
+        versions = {line[0]: line[1] for line in res}
+
+        cur.close()
+        return versions
+
     def remove_product(self, prod_id):
         con = sqlite3.connect(self.url)
         cur = con.cursor()
 
         cur.execute("DELETE FROM products "
-                    "WHERE prod_id = ?;", prod_id)
+                    "WHERE prod_id = ?;", (prod_id,))
         cur.connection.commit()
 
         cur.close()
@@ -14,6 +14,7 @@ class Product:
     amount: float = field(default=None)
     unit: str = field(default=None)
     prod_id: int = field(default=None)
+    category: str = field(default=None)
 
 
 @dataclass
@@ -1,6 +1,9 @@
 from math import ceil
+from threading import Lock
+from time import monotonic
 from typing import Collection
 
+import nltk
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 from nltk.tokenize import word_tokenize
@@ -9,10 +12,18 @@ from quantulum3.classes import Quantity
 
 from shop_cart_nlp.database import DBaccess
 from shop_cart_nlp.objects import Product
+from shop_cart_nlp.shard import Shard, ShardRouter
 
 
 class Processor:
-    stoplist = stopwords.words('english') + ['%', ';', '-', '``', '(', ')', ':', ',', '.', '']
+    # NOTE : filled lazily, so module can be imported before NLTK data is downloaded
+    stoplist = None
+    punctuation = ['%', ';', '-', '``', '(', ')', ':', ',', '.', '']
+    nltk_resources = {
+        'corpora/stopwords': 'stopwords',
+        'tokenizers/punkt': 'punkt',
+    }
+    nltk_ready = False
     stemmer = PorterStemmer()
     not_scalable_units = [
         "", "watt", "percentage", "yard", "year", "minute", "hour", "second", "byte", "decade", "megayear nanoseconds",
@@ -32,13 +43,46 @@ class Processor:
         "great gross": 1728.,
     }
 
-    def __init__(self, database: DBaccess):
+    def __init__(self, database: DBaccess, router: ShardRouter = None, check_interval: float = 1.):
         """
         Constructor
         :param database: Database connection
+        :param router: optional router limiting shards asked for each position
+        :param check_interval: minimal time in seconds between catalog version checks
         """
         self.database = database
-        self.index = []
+        self.shards = {}
+        self.shards_lock = Lock()
+        self.router = router
+        self.versions = {}
+        self.check_interval = check_interval
+        self.last_check = monotonic()
+        self.reload_requested = False
+
+    @classmethod
+    def ensure_nltk_data(cls):
+        """
+        Download NLTK data used by processor if not present yet
+        """
+        if cls.nltk_ready:
+            return
+        for path, package in cls.nltk_resources.items():
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                nltk.download(package)
+        cls.nltk_ready = True
+
+    @classmethod
+    def get_stoplist(cls) -> []:
+        """
+        Stop words with punctuation, loaded on first use
+        :return: stoplist
+        """
+        if cls.stoplist is None:
+            cls.ensure_nltk_data()
+            cls.stoplist = stopwords.words('english') + cls.punctuation
+        return cls.stoplist
 
     @classmethod
     def tokenize(cls, string: str) -> []:
@@ -47,6 +91,7 @@ class Processor:
         :param string: sentences
         :return: words
         """
+        cls.ensure_nltk_data()
         # NOTE : tokenizer may be changed - api stays the same
         return word_tokenize(string)
 
@@ -57,7 +102,8 @@ class Processor:
         :param array: array of words
         :return: array with words not present in stoplist
         """
-        return [w for w in array if w not in cls.stoplist and not (len(w) == 1 and not w.isalnum())]
+        stoplist = cls.get_stoplist()
+        return [w for w in array if w not in stoplist and not (len(w) == 1 and not w.isalnum())]
 
     @classmethod
     def apply_stemmer(cls, array: Collection[str]) -> []:
@@ -110,32 +156,26 @@ class Processor:
         """
         Method creating inverse stem index from collection of Products and parse product quantity
         :param products: collection of Products
+        :return: created index
         """
-        self.index = []
+        index = []
         for prod in products:
             amount, unit = self.find_quantity_for_product(prod)
             prod.amount = amount
             prod.unit = unit
             stems = self.product_to_bag_of_stems(prod)
-            self.index.append({'product': prod, 'stems': stems})
-
-    def create_index_from_db(self):
-        """
-        Method creating inverse stem index from Products present in database
-        """
-        products = self.database.get_products()
-        # NOTE : if we "update" index we have no way of knowing which products were processed
-        #        hence database will ignore inserts on conflict
-        self.create_index(products)
+            index.append({'product': prod, 'stems': stems})
+        return index
 
-    def save_index_to_db(self):
+    def save_index_to_db(self, index: Collection[dict]):
         """
-        Utility method inserting index (present in 'self' state) to database
+        Utility method inserting index to database
+        :param index: index created by create_index
         """
         # products
-        products = [i['product'] for i in self.index]
+        products = [i['product'] for i in index]
         # unique stems
-        stems = {s for i in self.index for s in i['stems']}
+        stems = {s for i in index for s in i['stems']}
 
         # save quantities of products
         self.database.save_quantities_of_products(products)
@@ -144,38 +184,136 @@ class Processor:
         self.database.add_stems(stems)
 
         # add connections
-        for i in self.index:
+        for i in index:
             self.database.add_conn_p_s(i['product'], i['stems'])  # 'stems' is set
 
-    def learn_from_db(self):
+    def learn_from_db(self, categories: Collection[str] = None):
+        """
+        Method creating and saving index (from & to database), shard by shard
+        :param categories: categories to be rebuilt, all present in database if None
+        """
+        if categories is None:
+            categories = self.database.get_categories()
+        for category in categories:
+            self.learn_shard_from_db(category)
+
+    def learn_shard_from_db(self, category: str):
+        """
+        Method creating and saving index of single shard (from & to database)
+        :param category: category served by shard
+        """
+        previous = self.database.get_versions().get(category, 0)
+        products = self.database.get_products(category)
+        # NOTE : local index - rebuilds of other shards may run concurrently
+        index = self.create_index(products) if products else []
+        if index:
+            self.save_index_to_db(index)
+
+        # NOTE : index is already saved - other processes may reload shard
+        version = self.database.bump_version(category)
+        # NOTE : if category was changed by someone else meanwhile, shard may miss their products -
+        #        keep previous version so next refresh reloads it from database
+        self.versions[category] = version if version == previous + 1 else previous
+
+        if products:
+            shard = Shard(category)
+            shard.build([(i['product'], i['stems']) for i in index])
+            self.set_shard(shard)
+        else:
+            self.drop_shard(category)
+
+    def load_index_from_db(self, categories: Collection[str] = None):
         """
-        Method creating and saving index (from & to database)
+        Method loading shards from index already saved in database (no stemming involved)
+        :param categories: categories to be loaded, all present in database if None
         """
-        self.create_index_from_db()
-        self.save_index_to_db()
+        # NOTE : versions read before data - change made meanwhile will be picked up by next refresh
+        versions = self.database.get_versions()
+        if categories is None:
+            self.versions = versions
+        else:
+            for category in categories:
+                self.versions[category] = versions.get(category)
+
+        indexed = {}
+        for prod, stems in self.database.get_indexed_products(categories):
+            indexed.setdefault(prod.category, []).append((prod, stems))
+
+        for category in (set(indexed) | set(self.shards) if categories is None else categories):
+            if category in indexed:
+                shard = Shard(category)
+                shard.build(indexed[category])
+                self.set_shard(shard)
+            else:
+                self.drop_shard(category)
+
+    def request_reload(self):
+        """
+        Force reload of all shards on next refresh (safe to call from signal handler)
+        """
+        self.reload_requested = True
+
+    def refresh_from_db(self):
+        """
+        Reload shards changed in database by other processes since last check
+        """
+        if not self.reload_requested and monotonic() - self.last_check < self.check_interval:
+            return
+        self.last_check = monotonic()
+
+        if self.reload_requested:
+            self.reload_requested = False
+            self.load_index_from_db()
+            return
+
+        versions = self.database.get_versions()
+        changed = [c for c in set(versions) | set(self.versions) if versions.get(c) != self.versions.get(c)]
+        if changed:
+            self.load_index_from_db(changed)
+
+    def set_shard(self, shard: Shard):
+        """
+        Replace (or add) shard, queries already running keep the previous one
+        :param shard: Shard instance
+        """
+        with self.shards_lock:
+            shards = dict(self.shards)
+            shards[shard.category] = shard
+            self.shards = shards
+
+    def drop_shard(self, category: str):
+        """
+        Remove shard if present
+        :param category: category served by shard
+        """
+        with self.shards_lock:
+            if category in self.shards:
+                shards = dict(self.shards)
+                del shards[category]
+                self.shards = shards
 
     def find_best_product(self, stems: Collection):
         """
-        Finds best fitting product by performing inverse search
+        Finds best fitting product by performing inverse search on each (routed) shard
         :param stems: bag of stems from listing
         :return: best fitting product
         """
+        # NOTE : local reference - shards may be swapped by rebuild meanwhile
+        shards = self.shards
+        categories = self.router.route(shards, stems) if self.router else list(shards)
 
-        def increment_dict(p_dict, value):
-            if value in p_dict:
-                p_dict[value] = 1 + p_dict[value]
-            else:
-                p_dict[value] = 1
-
-        products_dict = {}
-        for st in stems:
-            prod_pivot = self.database.get_products_for_stem(st)
-            for prod in prod_pivot:
-                increment_dict(products_dict, str(prod.prod_id))
+        # NOTE : scoring is pure python holding the GIL - threads would only add overhead
+        # merge - shards are disjoint so best product overall is best of shards' best
+        best_shard, best_id, best_score = None, None, 0
+        for shard in (shards[c] for c in categories):
+            products_dict = shard.score(stems)
+            if products_dict:
+                most_prob_prod = max(products_dict, key=products_dict.get)
+                if products_dict[most_prob_prod] > best_score:
+                    best_shard, best_id, best_score = shard, most_prob_prod, products_dict[most_prob_prod]
 
-        if products_dict:
-            most_prob_prod = max(products_dict, key=products_dict.get)
-            return self.database.get_product(most_prob_prod)
+        if best_shard:
+            return best_shard.get_product(best_id)
 
         return None
 
@@ -0,0 +1,94 @@
+from typing import Collection, Dict, List
+
+from shop_cart_nlp.objects import Product
+
+
+class Shard:
+    def __init__(self, category: str):
+        """
+        Constructor
+        :param category: name of category served by this shard
+        """
+        self.category = category
+        self.products = {}
+        self.inverted = {}
+
+    def build(self, index: Collection[tuple]):
+        """
+        Method (re)building inverted stem index of this shard
+        :param index: collection of pairs (product, bag of stems)
+        """
+        products = {}
+        inverted = {}
+        for prod, stems in index:
+            products[prod.prod_id] = prod
+            for st in stems:
+                inverted.setdefault(st, []).append(prod.prod_id)
+        # NOTE : swap at the end so queries running meanwhile see either old or new index
+        self.products = products
+        self.inverted = inverted
+
+    def __len__(self):
+        return len(self.products)
+
+    def stem_frequency(self, stem: str) -> int:
+        """
+        Number of products in shard referencing stem
+        :param stem: stem as string
+        :return: product count
+        """
+        return len(self.inverted.get(stem, ()))
+
+    def score(self, stems: Collection[str]) -> Dict[int, int]:
+        """
+        Performs inverse search inside shard
+        :param stems: bag of stems from listing
+        :return: dict of product id to number of matching stems
+        """
+        inverted = self.inverted
+        scores = {}
+        for st in stems:
+            for prod_id in inverted.get(st, ()):
+                scores[prod_id] = scores.get(prod_id, 0) + 1
+        return scores
+
+    def get_product(self, prod_id: int) -> Product:
+        """
+        Get product served by shard
+        :param prod_id: product id
+        :return: product or None
+        """
+        return self.products.get(prod_id)
+
+
+class ShardRouter:
+    def __init__(self, min_share: float = 0.5, max_shards: int = None):
+        """
+        Constructor
+        :param min_share: shards scoring below this fraction of the best shard are skipped
+        :param max_shards: upper limit of shards asked for one position, all if None
+        """
+        self.min_share = min_share
+        self.max_shards = max_shards
+
+    def route(self, shards: Dict[str, Shard], stems: Collection[str]) -> List[str]:
+        """
+        Choose shards likely containing product for position based on stem statistics
+        :param shards: dict of category name to shard
+        :param stems: bag of stems from listing
+        :return: list of category names ordered from most likely
+        """
+        # NOTE : share of shard products referencing stem, so big shards do not win by size only
+        scores = {}
+        for category, shard in shards.items():
+            if len(shard):
+                score = sum(shard.stem_frequency(st) for st in stems) / len(shard)
+                if score > 0:
+                    scores[category] = score
+
+        if not scores:
+            return []
+
+        best = max(scores.values())
+        routed = sorted((c for c in scores if scores[c] >= best * self.min_share), key=scores.get, reverse=True)
+        return routed[:self.max_shards] if self.max_shards else routed